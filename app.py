@@ -2,11 +2,15 @@ import asyncio
 import nest_asyncio
 import os
 import re
-import json
+import shutil
+import string
 import time
+import json
+import pandas as pd
 import streamlit as st
 import base64
 from io import BytesIO
+from PIL import Image
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -14,13 +18,26 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from google import genai
+from rapidfuzz import fuzz, process
+from llm_cache import LLMCache, SemanticCache
 
 # Load environment variables from .env
 load_dotenv()
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 if not GEMINI_API_KEY:
     st.error("GEMINI_API_KEY environment variable not set. Please configure it properly.")
+GEMINI_MODEL = "gemini-2.0-flash"
+EMBEDDING_MODEL = "text-embedding-004"
+# Fonts, media and analytics requests the scraper never needs; blocked over CDP
+_BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*",
+]
+# Batch Mode job states after which a job will make no more progress
+_BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
 
 # Initialize asyncio for threaded environments
 try:
@@ -32,41 +49,76 @@ except RuntimeError:
 # Apply nest_asyncio to allow nested event loops 
 # (sometimes needed in Streamlit)
 nest_asyncio.apply()
+
+# Precompiled patterns used while answering and filling forms
+_PUNCT_RE = re.compile(r'[^\w\s]')
+# For ASCII text, deleting punctuation (except `_`, a word character) and
+# non-whitespace control characters strips exactly what _PUNCT_RE does, in one
+# C-level pass
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation.replace('_', '') + ''.join(
+    chr(c) for c in range(128) if not chr(c).isprintable() and not chr(c).isspace()
+))
+# Personal-information questions we leave for the user instead of asking Gemini.
+# Only short, label-style fields ("Student Name", "PRN No", "Date of Birth (DD/MM/YYYY)") match, so
+# quiz questions that merely mention e.g. an address are still answered.
+_PII_RE = re.compile(
+    r'^\s*(student\s+|enter\s+your\s+)?(your\s+)?(full\s+)?'
+    r'(name( of (the )?student)?|roll ?(no|number)|(prn|grn)( no| number)?|e-?mail( id| address)?'
+    r'|mobile( no| number)?|phone( no| number)?|address|dob|date of birth)'
+    r'\s*(\(.*\))?\s*[:*.?]*\s*$',
+    re.I
+)
+_PII_MAX_LEN = 40
 # --- Utility Functions ---
 
-def take_screenshot(driver):
+def is_personal_info(question_text):
+    """
+    Returns True if the question looks like a personal-information field.
+    """
+    return len(question_text.strip()) <= _PII_MAX_LEN and bool(_PII_RE.match(question_text))
+
+def take_screenshot(driver, max_w=960):
     """
     Takes a screenshot of the current browser window and returns it as an image
-    that can be displayed in Streamlit.
+    that can be displayed in Streamlit. The image is scaled down to `max_w`
+    pixels wide and JPEG-encoded to keep it small.
     """
-    screenshot = driver.get_screenshot_as_png()
+    png = driver.get_screenshot_as_png()
+    img = Image.open(BytesIO(png)).convert("RGB")
+    if img.width > max_w:
+        img = img.resize((max_w, int(img.height * max_w / img.width)), Image.BILINEAR)
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=70)
+    return buf.getvalue()
+
+def show_screenshot(driver, caption, debug=False):
+    """
+    Takes a screenshot and displays it, unless screenshots are turned off in
+    the sidebar. `debug` screenshots (intermediate steps) are only taken when
+    step-by-step screenshots are enabled. Returns the image, or None if it was
+    skipped.
+    """
+    if not st.session_state.get("show_screenshots", True):
+        return None
+    if debug and not st.session_state.get("debug_screenshots", False):
+        return None
+    screenshot = take_screenshot(driver)
+    st.image(screenshot, caption=caption, use_column_width=True)
     return screenshot
 
-def extract_questions_from_fb_data(html):
+def extract_questions(driver):
     """
-    Parses the rendered HTML to extract questions and options from the
-    FB_PUBLIC_LOAD_DATA_ JavaScript variable.
+    Extracts questions and options from the form's FB_PUBLIC_LOAD_DATA_
+    JavaScript variable. The browser has already parsed it, so we read it
+    directly instead of scraping the page source.
     """
-    match = re.search(r'var\s+FB_PUBLIC_LOAD_DATA_\s*=\s*(\[.*?\]);</script>', html, re.DOTALL)
-    if not match:
-        st.error("FB_PUBLIC_LOAD_DATA_ not found in HTML.")
-        return []
-    raw_json = match.group(1)
-    # Replace common escaped sequences for valid JSON
-    replacements = {
-        r'\\n': '\n',
-        r'\\u003c': '<',
-        r'\\u003e': '>',
-        r'\\u0026': '&',
-        r'\\"': '"'
-    }
-    for old, new in replacements.items():
-        raw_json = raw_json.replace(old, new)
-    raw_json = re.sub(r'[\x00-\x08\x0B-\x1F\x7F]', '', raw_json)
     try:
-        data = json.loads(raw_json)
-    except json.JSONDecodeError as e:
-        st.error(f"Error decoding FB_PUBLIC_LOAD_DATA_ JSON: {e}")
+        data = driver.execute_script("return window.FB_PUBLIC_LOAD_DATA_;")
+    except Exception as e:
+        st.error(f"Error reading FB_PUBLIC_LOAD_DATA_: {e}")
+        return []
+    if data is None:
+        st.error("FB_PUBLIC_LOAD_DATA_ not found on the page.")
         return []
     
     # Typically, questions are stored in data[1][1]
@@ -84,93 +136,341 @@ def extract_questions_from_fb_data(html):
             continue
         q_text = q_text.strip()
         # For multiple-choice questions, options usually appear in item[4]
-        choices = []
-        if len(item) > 4 and isinstance(item[4], list):
-            for block in item[4]:
-                if isinstance(block, list) and len(block) > 1 and isinstance(block[1], list):
-                    for opt in block[1]:
-                        if isinstance(opt, list) and len(opt) > 0 and isinstance(opt[0], str):
-                            choices.append(opt[0])
+        choices = [
+            opt[0]
+            for block in item[4]
+            if isinstance(block, list) and len(block) > 1 and isinstance(block[1], list)
+            for opt in block[1]
+            if isinstance(opt, list) and opt and isinstance(opt[0], str)
+        ] if len(item) > 4 and isinstance(item[4], list) else []
         questions.append({
             "question_text": q_text,
             "options": choices
         })
     return questions
 
+@st.cache_resource
+def get_gemini_client(api_key):
+    """
+    Returns a Gemini client shared across reruns, so its HTTP connection pool
+    (and the TLS sessions in it) is reused between forms.
+    """
+    return genai.Client(api_key=api_key)
+
+@st.cache_resource
+def get_llm_cache():
+    """
+    Returns the process-wide Gemini answer cache, shared across reruns and sessions.
+    """
+    return LLMCache()
+
+@st.cache_resource
+def get_semantic_cache():
+    """
+    Returns the process-wide embedding cache used to answer near-duplicate questions.
+    """
+    return SemanticCache()
+
+def embed_questions(client, questions):
+    """
+    Embeds the text of each question with a single Gemini embeddings request.
+    """
+    response = client.models.embed_content(
+        model=EMBEDDING_MODEL,
+        contents=[q["question_text"] for q in questions]
+    )
+    return [embedding.values for embedding in response.embeddings]
+
+# Prompt templates, filled in with str.format for each question (or form)
+_MC_TMPL = """
+        Question: {question_text}
+        
+        These are the EXACT options (choose only one):
+        {options}
+        
+        Instructions:
+        1. Choose exactly ONE option from the list above
+        2. Return ONLY the exact text of the chosen option, nothing else
+        3. Do not add any explanation, just the option text
+        4. Do not add quotation marks around the option
+        5. Don not answer questions like "What is your name?","Rollno","PRN/GRN","Email","Mobile No","Address","DOB etc
+        
+        Answer:
+        """
+_TEXT_TMPL = """
+        Question: {question_text}
+        
+        Please provide a brief and direct answer to this question.
+        Keep your answer concise (1-2 sentences maximum).
+        
+        Answer:
+        """
+_BATCH_TMPL = """
+    Answer every question below.
+    
+    {questions_block}
+    Instructions:
+    1. For questions with options, return ONLY the exact text of ONE option
+    2. For free-text questions, keep the answer brief and direct
+    3. Do not answer questions like "What is your name?","Rollno","PRN/GRN","Email","Mobile No","Address","DOB etc, use an empty string instead
+    4. Return a JSON array like [{{"idx": 0, "answer": "..."}}] with one entry per question
+    """
+
+def _quote_options(options):
+    return ", ".join([f'"{opt}"' for opt in options])
+
+def build_prompt(question_text, options):
+    """
+    Builds the single-question prompt used when answering questions one by one.
+    """
+    if options:
+        return _MC_TMPL.format(question_text=question_text, options=_quote_options(options))
+    return _TEXT_TMPL.format(question_text=question_text)
+
+def build_batch_prompt(questions):
+    """
+    Builds one prompt covering every question so Gemini can answer the whole
+    form in a single request.
+    """
+    lines = []
+    for idx, q in enumerate(questions):
+        lines.append(f"Question {idx}: {q['question_text']}")
+        if q["options"]:
+            lines.append("Options (choose exactly one): " + _quote_options(q["options"]))
+        else:
+            lines.append("Free text (answer in 1-2 sentences)")
+        lines.append("")
+    return _BATCH_TMPL.format(questions_block="\n".join(lines))
+
+def match_option(answer, options):
+    """
+    Snaps a generated answer onto one of the available options.
+    """
+    # Lower-case everything once; both passes below compare the lowered forms
+    answer_lo = answer.lower()
+    lowered = [opt.lower() for opt in options]
+    for opt, opt_lo in zip(options, lowered):
+        if opt_lo == answer_lo:
+            return opt  # Use the exact casing from the original option
+    
+    # If no exact match, use the most similar option
+    _, _, best_idx = process.extractOne(answer_lo, lowered, scorer=fuzz.ratio)
+    return options[best_idx]
+
+def generate_answers_batch(client, questions):
+    """
+    Answers all questions with a single structured-output Gemini call.
+    Returns a dict mapping question index to raw answer text, or raises
+    ValueError if the response can't be parsed, misses a question or answers
+    one twice. Out-of-range indices are dropped.
+    """
+    schema = {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "idx": {"type": "INTEGER"},
+                "answer": {"type": "STRING"},
+            },
+            "required": ["idx", "answer"],
+        },
+    }
+    response = client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=build_batch_prompt(questions),
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+        },
+    )
+    try:
+        items = json.loads(response.text)
+        answers = {}
+        for item in items:
+            idx = int(item["idx"])
+            # Ignore indices that don't refer to a question we sent
+            if not 0 <= idx < len(questions):
+                continue
+            if idx in answers:
+                raise ValueError(f"duplicate answer for question {idx}")
+            answers[idx] = str(item["answer"]).strip()
+    except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+        raise ValueError(f"Could not parse batch response: {e}")
+    
+    missing = [idx for idx in range(len(questions)) if idx not in answers]
+    if missing:
+        raise ValueError(f"Batch response is missing answers for questions {missing}")
+    return answers
+
+def generate_answers_batch_job(client, questions, poll_interval=5, timeout=600):
+    """
+    Answers questions through a Gemini Batch Mode job, which costs about half
+    as much as regular requests but is queued, so it can take minutes.
+    Returns a dict mapping question index to raw answer text; questions whose
+    request failed inside the job or came back without text are left out.
+    """
+    inline_requests = [
+        {"contents": [{"parts": [{"text": build_prompt(q["question_text"], q["options"])}], "role": "user"}]}
+        for q in questions
+    ]
+    job = client.batches.create(model=GEMINI_MODEL, src=inline_requests)
+    
+    deadline = time.monotonic() + timeout
+    while job.state.name not in _BATCH_DONE_STATES:
+        if time.monotonic() > deadline:
+            try:
+                client.batches.cancel(name=job.name)
+            except Exception as e:
+                print(f"Could not cancel batch job {job.name}: {e}")
+            raise TimeoutError(f"Batch job {job.name} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+        job = client.batches.get(name=job.name)
+    
+    if job.state.name != "JOB_STATE_SUCCEEDED":
+        raise RuntimeError(f"Batch job {job.name} ended in state {job.state.name}")
+    
+    if job.dest is None or job.dest.inlined_responses is None:
+        raise RuntimeError(f"Batch job {job.name} returned no inline responses")
+    
+    # Blocked or empty responses are left out for the per-question fallback
+    answers = {}
+    for idx, inline_response in enumerate(job.dest.inlined_responses):
+        response = inline_response.response
+        if response is not None and response.text is not None:
+            answers[idx] = response.text.strip()
+    return answers
+
+async def generate_answers_concurrently(client, questions, limit=8):
+    """
+    Sends one Gemini request per question concurrently, with at most `limit`
+    requests in flight. Returns the raw answers (or the raised exceptions) in
+    the same order as `questions`. Requests go through the sync client in
+    worker threads, because the client is shared across reruns and its
+    connection pool is thread-safe, unlike an async pool tied to one event loop.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def _one(q):
+        async with semaphore:
+            response = await asyncio.to_thread(
+                client.models.generate_content,
+                model=GEMINI_MODEL,
+                contents=build_prompt(q["question_text"], q["options"])
+            )
+            return response.text.strip()
+    
+    return await asyncio.gather(*[_one(q) for q in questions], return_exceptions=True)
+
 def generate_answers(questions, api_key):
     """
-    For each question, call Google Gemini to generate an answer that matches available options.
+    Calls Google Gemini to generate an answer for every question that matches the
+    available options. All questions are sent in one batched request (or, if
+    enabled in the sidebar, one Batch Mode job); whatever that doesn't answer
+    falls back to concurrent per-question requests.
+    Identical questions (same text and options) are only asked once, and
+    personal-information questions are left blank without calling Gemini.
     """
     try:
-        # Ensure we have an event loop in this thread
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        client = genai.Client(api_key=api_key)
+        # The event loop for this thread is set up when the script starts
+        loop = asyncio.get_event_loop()
+        client = get_gemini_client(api_key)
+        cache = get_llm_cache()
         
+        # Group identical questions so each one is answered once and the
+        # answer is copied to all of them
+        groups = {}
         for q in questions:
-            question_text = q["question_text"]
-            options = q["options"]
-            
-            # Rest of your existing function code...
-            if options:
-                prompt = f"""
-                Question: {question_text}
-                
-                These are the EXACT options (choose only one):
-                {', '.join([f'"{opt}"' for opt in options])}
-                
-                Instructions:
-                1. Choose exactly ONE option from the list above
-                2. Return ONLY the exact text of the chosen option, nothing else
-                3. Do not add any explanation, just the option text
-                4. Do not add quotation marks around the option
-                5. Don not answer questions like "What is your name?","Rollno","PRN/GRN","Email","Mobile No","Address","DOB etc
-                
-                Answer:
-                """
-            else:
-                prompt = f"""
-                Question: {question_text}
-                
-                Please provide a brief and direct answer to this question.
-                Keep your answer concise (1-2 sentences maximum).
-                
-                Answer:
-                """
+            groups.setdefault((q["question_text"], tuple(q["options"])), []).append(q)
+        
+        # Personal-information fields are left blank for the user to fill in
+        for key in list(groups):
+            if not key[1] and is_personal_info(key[0]):
+                for q in groups.pop(key):
+                    q["gemini_answer"] = ""
+        unique = [group[0] for group in groups.values()]
+        
+        # Reuse answers from earlier runs; only uncached questions go to Gemini
+        answers = {}
+        cache_keys = {}
+        for idx, q in enumerate(unique):
+            cache_keys[idx] = cache.make_key(GEMINI_MODEL, q["question_text"], q["options"])
+            cached = cache.get(cache_keys[idx])
+            if cached is not None:
+                answers[idx] = cached
+        
+        # Questions that miss the exact cache may still be paraphrases of ones answered before
+        semantic_cache = get_semantic_cache()
+        embeddings = {}
+        missed = [idx for idx in range(len(unique)) if idx not in answers]
+        # With nothing stored yet there's nothing to match, so don't hold up
+        # the answer request on an embeddings round trip
+        if missed and len(semantic_cache):
+            try:
+                vectors = embed_questions(client, [unique[idx] for idx in missed])
+                for idx, vector in zip(missed, vectors):
+                    embeddings[idx] = vector
+                    similar = semantic_cache.lookup(vector, unique[idx]["options"])
+                    if similar is not None:
+                        answers[idx] = similar
+            except Exception as e:
+                print(f"Semantic cache lookup failed, skipping it: {e}")
+        cached_indices = set(answers)
+        uncached = [idx for idx in range(len(unique)) if idx not in cached_indices]
+        
+        if uncached:
+            try:
+                if st.session_state.get("use_batch_mode", False):
+                    batch_answers = generate_answers_batch_job(client, [unique[idx] for idx in uncached])
+                else:
+                    batch_answers = generate_answers_batch(client, [unique[idx] for idx in uncached])
+                answers.update((uncached[i], answer) for i, answer in batch_answers.items())
+            except Exception as e:
+                print(f"Batch answer generation failed, falling back to per-question requests: {e}")
+        
+        # Anything the batch didn't answer is requested individually, in parallel
+        pending = [idx for idx in range(len(unique)) if idx not in answers]
+        if pending:
+            results = loop.run_until_complete(
+                generate_answers_concurrently(client, [unique[idx] for idx in pending])
+            )
+            answers.update(zip(pending, results))
+        
+        new_answers = {}
+        for idx, group in enumerate(groups.values()):
+            options = group[0]["options"]
             
             try:
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt
-                )
-                
-                answer = response.text.strip()
+                answer = answers[idx]
+                if isinstance(answer, Exception):
+                    raise answer
                 
                 # For multiple choice, ensure it exactly matches one of the options
                 if options:
-                    exact_match = False
-                    for opt in options:
-                        if opt.lower() == answer.lower():
-                            answer = opt  # Use the exact casing from the original option
-                            exact_match = True
-                            break
-                    
-                    # If no exact match, use the most similar option
-                    if not exact_match:
-                        from difflib import SequenceMatcher
-                        best_match = max(options, key=lambda opt: SequenceMatcher(None, opt.lower(), answer.lower()).ratio())
-                        answer = best_match
+                    answer = match_option(answer, options)
                 
-                q["gemini_answer"] = answer
+                for q in group:
+                    q["gemini_answer"] = answer
+                if idx not in cached_indices:
+                    cache.set(cache_keys[idx], answer)
+                    new_answers[idx] = answer
                 
             except Exception as e:
-                q["gemini_answer"] = f"Error: {str(e)}"
+                for q in group:
+                    q["gemini_answer"] = f"Error: {str(e)}"
                 st.error(f"Error generating answer: {str(e)}")
-                
+        
+        # Remember new answers for similar questions later, embedding any
+        # that weren't embedded for the lookup above in one request
+        to_embed = [idx for idx in new_answers if idx not in embeddings]
+        if to_embed:
+            try:
+                embeddings.update(zip(to_embed, embed_questions(client, [unique[idx] for idx in to_embed])))
+            except Exception as e:
+                print(f"Could not embed new answers for the semantic cache: {e}")
+        for idx, answer in new_answers.items():
+            if idx in embeddings:
+                semantic_cache.add(embeddings[idx], unique[idx]["options"], answer)
+        semantic_cache.save()
         return questions
         
     except Exception as e:
@@ -181,14 +481,156 @@ def generate_answers(questions, api_key):
                 q["gemini_answer"] = f"Error: Could not generate answer due to {str(e)}"
         return questions
 
+def _normalize(text):
+    """
+    Lower-cases text and strips punctuation so option matching is forgiving.
+    """
+    text = text.lower()
+    if text.isascii():
+        return text.translate(_PUNCT_TABLE).strip()
+    return _PUNCT_RE.sub('', text).strip()
+
+# Collects every question container's option elements, their texts and its text
+# input in a single WebDriver round trip. Each list of fallback selectors is
+# matched with one combined query, then narrowed to the first selector that
+# hits, so the page is scanned once per container but the fallback order (and
+# with it the option positions) stays the same.
+_FORM_SNAPSHOT_JS = """
+const firstMatching = (root, selectors) => {
+    const all = Array.from(root.querySelectorAll(selectors.join(", ")));
+    for (const sel of selectors) {
+        const found = all.filter(e => e.matches(sel));
+        if (found.length) return found;
+    }
+    return [];
+};
+const containerSelectors = [
+    "div.freebirdFormviewerViewItemsItemItem",
+    "div[role='listitem']"
+];
+const optionSelectors = [
+    "div[role='radio']",
+    "label",
+    "div.appsMaterialWizToggleRadiogroupRadioButtonContainer",
+    ".docssharedWizToggleLabeledLabelWrapper"
+];
+return firstMatching(document, containerSelectors).map(c => {
+    const options = firstMatching(c, optionSelectors);
+    const texts = options.map(e => {
+        let text = (e.innerText || "").trim();
+        if (!text) {
+            const child = Array.from(e.querySelectorAll("div")).find(d => (d.innerText || "").trim());
+            text = child ? child.innerText.trim() : "";
+        }
+        return text || e.getAttribute("data-value") || e.getAttribute("aria-label") || "";
+    });
+    const input = c.querySelector("input[type='text']") || c.querySelector("textarea") || c.querySelector("input");
+    return {options: options, texts: texts, input: input};
+});
+"""
+
+# Clicks every element passed in, in order, in a single WebDriver round trip.
+# A click that throws doesn't stop the rest; the positions of the failed ones
+# are returned.
+_CLICK_ALL_JS = """
+const failed = [];
+arguments[0].forEach((e, i) => {
+    try {
+        e.click();
+    } catch (err) {
+        failed.push(i);
+    }
+});
+return failed;
+"""
+
+def choose_option(answer, options, option_texts):
+    """
+    Picks which option element to click for a multiple-choice answer.
+    Returns the element index, or None if nothing matched well enough.
+    """
+    # Normalize the answer text to make matching more robust
+    normalized_answer = _normalize(answer)
+    # Normalize the original options once; every pass below reuses these
+    norm_opts = [_normalize(o) for o in options]
+    
+    # First pass: Try exact matches
+    print("\nTrying exact matches...")
+    
+    # Map normalized option text to element index, skipping options without text
+    option_dict = {_normalize(opt_text): i for i, opt_text in enumerate(option_texts) if opt_text}
+    print(f"Form options (normalized): {list(option_dict)}")
+    
+    # Try exact match
+    if normalized_answer in option_dict:
+        print(f"Found exact match for: '{normalized_answer}'")
+        return option_dict[normalized_answer]
+    
+    # Try substring matches
+    for opt_text, i in option_dict.items():
+        if opt_text in normalized_answer or normalized_answer in opt_text:
+            print(f"Found partial match: '{opt_text}' with answer '{normalized_answer}'")
+            return i
+    
+    # Try matching with original options, exact match first via a lookup
+    # (the first option wins if two normalize the same)
+    print("\nTrying to match with original options list...")
+    orig_index = {norm: i for i, norm in reversed(list(enumerate(norm_opts)))}
+    i = orig_index.get(normalized_answer)
+    if i is not None and i < len(option_texts):
+        print(f"EXACT match with original option: '{options[i]}', clicking by position: element {i}")
+        return i
+    
+    # Then try substring matching
+    for i, normalized_orig in enumerate(norm_opts):
+        if normalized_orig in normalized_answer or normalized_answer in normalized_orig:
+            print(f"PARTIAL match with original option: '{options[i]}'")
+            if i < len(option_texts):
+                return i
+    
+    # Try similarity matching as last resort
+    print("\nNo direct matches found, trying similarity matching...")
+    
+    # Try matching with form elements (require at least 60% similarity)
+    best = process.extractOne(normalized_answer, list(option_dict.keys()), scorer=fuzz.ratio, score_cutoff=60)
+    if best:
+        opt_text, best_score, _ = best
+        print(f"Best similarity match score: {best_score}")
+        return option_dict[opt_text]
+    
+    # Try matching with original options (50% similarity threshold)
+    best = process.extractOne(normalized_answer, norm_opts, scorer=fuzz.ratio, score_cutoff=50)
+    if best and best[2] < len(option_texts):
+        _, best_score, best_idx = best
+        print(f"Best similarity with original option: '{options[best_idx]}' (score: {best_score})")
+        return best_idx
+    
+    return None
+
+def wait_for_form(driver, timeout=10):
+    """
+    Waits until the form's question containers are present. Returns False if
+    they don't show up within `timeout` seconds.
+    """
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.freebirdFormviewerViewItemsItemItem, div[role='listitem']"))
+        )
+        return True
+    except TimeoutException:
+        return False
+
 def fill_form(driver, questions):
     """
     Fills the Google Form with generated answers using the provided driver.
+    The form is read in one script call and all option clicks are sent in
+    another, so the number of WebDriver round trips doesn't grow with the
+    number of options.
     """
-    # Locate question containers (try different selectors)
-    question_containers = driver.find_elements(By.CSS_SELECTOR, "div.freebirdFormviewerViewItemsItemItem")
-    if not question_containers:
-        question_containers = driver.find_elements(By.CSS_SELECTOR, "div[role='listitem']")
+    # Wait for the form to render, then locate question containers along with
+    # their options and inputs
+    wait_for_form(driver)
+    question_containers = driver.execute_script(_FORM_SNAPSHOT_JS)
     if not question_containers:
         st.error("Could not locate question containers in the form.")
         return False
@@ -197,8 +639,10 @@ def fill_form(driver, questions):
     print(f"Found {len(question_containers)} question containers in the form")
     print(f"We have {len(questions)} questions with answers to fill")
 
-    # Give the form time to fully render
-    time.sleep(2)
+    # Option elements to click, collected so they can be clicked in one go,
+    # along with the index of the question each one answers
+    to_click = []
+    click_questions = []
 
     for idx, q in enumerate(questions):
         if idx >= len(question_containers):
@@ -213,19 +657,17 @@ def fill_form(driver, questions):
         print(f"Question: {q['question_text']}")
         print(f"Generated Answer: {answer}")
         
+        # Nothing to fill (e.g. personal-information questions), leave it for the user
+        if not answer:
+            st.info(f"Question {idx+1} has no generated answer (e.g. a personal-information field) and was left blank for you to fill in")
+            print("No answer generated, leaving this question blank")
+            continue
+        
         if options:
             try:
                 print(f"This is a multiple-choice question with {len(options)} options")
                 
-                # Try multiple selector strategies to find radio buttons or checkboxes
-                option_elements = container.find_elements(By.CSS_SELECTOR, "div[role='radio']")
-                if not option_elements:
-                    option_elements = container.find_elements(By.CSS_SELECTOR, "label")
-                if not option_elements:
-                    option_elements = container.find_elements(By.CSS_SELECTOR, "div.appsMaterialWizToggleRadiogroupRadioButtonContainer")
-                if not option_elements:
-                    option_elements = container.find_elements(By.CSS_SELECTOR, ".docssharedWizToggleLabeledLabelWrapper")
-                
+                option_elements = container["options"]
                 if not option_elements:
                     st.warning(f"Could not find option elements for question {idx+1}")
                     print("No option elements found with any selector strategy")
@@ -233,125 +675,15 @@ def fill_form(driver, questions):
                 
                 print(f"Found {len(option_elements)} option elements in the form")
                 
-                # Normalize the answer text to make matching more robust
-                import re
-                normalized_answer = re.sub(r'[^\w\s]', '', answer.lower()).strip()
-                
-                # First pass: Try exact matches
-                clicked = False
-                print("\nTrying exact matches...")
-                
-                # Create a dictionary mapping option text to elements
-                option_dict = {}
-                
-                # First extract all option texts
-                for i, opt_elem in enumerate(option_elements):
-                    # Get text directly and from child elements if needed
-                    opt_text = opt_elem.text.strip()
-                    
-                    # If no text, try getting from child elements
-                    if not opt_text:
-                        for child in opt_elem.find_elements(By.XPATH, ".//div"):
-                            child_text = child.text.strip()
-                            if child_text:
-                                opt_text = child_text
-                                break
-                                
-                    # Still no text? Try aria-label
-                    if not opt_text:
-                        opt_text = opt_elem.get_attribute("aria-label") or ""
-                        
-                    # Store in dictionary for later use if we have text
-                    if opt_text:
-                        normalized_opt = re.sub(r'[^\w\s]', '', opt_text.lower()).strip()
-                        option_dict[normalized_opt] = opt_elem
-                        print(f"Option {i+1}: '{opt_text}' (normalized: '{normalized_opt}')")
-                    else:
-                        print(f"Option {i+1}: [NO TEXT FOUND]")
-                
-                # Try exact match
-                if normalized_answer in option_dict:
-                    print(f"Found exact match for: '{normalized_answer}'")
-                    option_dict[normalized_answer].click()
-                    clicked = True
-                else:
-                    # Try substring matches
-                    for opt_text, opt_elem in option_dict.items():
-                        if opt_text in normalized_answer or normalized_answer in opt_text:
-                            print(f"Found partial match: '{opt_text}' with answer '{normalized_answer}'")
-                            opt_elem.click()
-                            clicked = True
-                            break
-                
-                # Try matching with original options
-                if not clicked:
-                    print("\nTrying to match with original options list...")
-                    for i, original_opt in enumerate(options):
-                        print(f"Original option {i+1}: '{original_opt}'")
-                        normalized_orig = re.sub(r'[^\w\s]', '', original_opt.lower()).strip()
-                        
-                        # First check direct equality
-                        if normalized_orig == normalized_answer:
-                            print(f"EXACT match with original option: '{original_opt}'")
-                            
-                            # Find matching element in the dictionary or by position
-                            if normalized_orig in option_dict:
-                                option_dict[normalized_orig].click()
-                                clicked = True
-                                break
-                            elif i < len(option_elements):
-                                print(f"Clicking by position: element {i}")
-                                option_elements[i].click()
-                                clicked = True
-                                break
-                        
-                        # Then try substring matching
-                        elif normalized_orig in normalized_answer or normalized_answer in normalized_orig:
-                            print(f"PARTIAL match with original option: '{original_opt}'")
-                            if i < len(option_elements):
-                                option_elements[i].click()
-                                clicked = True
-                                break
-                
-                # Try similarity matching as last resort
-                if not clicked:
-                    print("\nNo direct matches found, trying similarity matching...")
-                    from difflib import SequenceMatcher
-                    
-                    # Try matching with form elements
-                    best_score = 0
-                    best_element = None
-                    for opt_text, opt_elem in option_dict.items():
-                        score = SequenceMatcher(None, opt_text, normalized_answer).ratio()
-                        if score > best_score and score > 0.6:  # Require at least 60% similarity
-                            best_score = score
-                            best_element = opt_elem
-                    
-                    if best_element:
-                        print(f"Best similarity match score: {best_score}")
-                        best_element.click()
-                        clicked = True
-                    else:
-                        # Try matching with original options
-                        best_score = 0
-                        best_idx = 0
-                        for i, original_opt in enumerate(options):
-                            normalized_orig = re.sub(r'[^\w\s]', '', original_opt.lower()).strip()
-                            score = SequenceMatcher(None, normalized_orig, normalized_answer).ratio()
-                            if score > best_score:
-                                best_score = score
-                                best_idx = i
-                        
-                        if best_score > 0.5 and best_idx < len(option_elements):  # 50% similarity threshold
-                            print(f"Best similarity with original option: '{options[best_idx]}' (score: {best_score})")
-                            option_elements[best_idx].click()
-                            clicked = True
+                choice = choose_option(answer, options, container["texts"])
                 
                 # Last resort: click first option if nothing matched
-                if not clicked and option_elements:
+                if choice is None:
                     st.warning(f"No match found for question {idx+1}, selecting first option as fallback")
                     print("No suitable match found, clicking first option as fallback")
-                    option_elements[0].click()
+                    choice = 0
+                to_click.append(option_elements[choice])
+                click_questions.append(idx)
                     
             except Exception as e:
                 st.error(f"Error filling multiple-choice question {idx+1}: {e}")
@@ -359,29 +691,11 @@ def fill_form(driver, questions):
         else:
             try:
                 print("This is a text question")
-                # For text questions, locate the text input or textarea and fill in the answer
-                input_elem = None
-                
-                # Try multiple strategies to find the text input
-                try:
-                    input_elem = container.find_element(By.CSS_SELECTOR, "input[type='text']")
-                    print("Found text input element")
-                except Exception:
-                    try:
-                        input_elem = container.find_element(By.CSS_SELECTOR, "textarea")
-                        print("Found textarea element")
-                    except Exception:
-                        try:
-                            # Try more generic selectors
-                            input_elem = container.find_element(By.CSS_SELECTOR, "input")
-                            print("Found generic input element")
-                        except Exception:
-                            try:
-                                input_elem = container.find_element(By.TAG_NAME, "textarea")
-                                print("Found generic textarea element")
-                            except Exception:
-                                st.error(f"Could not locate input element for question {idx+1}")
-                                print("Failed to find any input element for this question")
+                # For text questions, fill in the text input or textarea found in the snapshot
+                input_elem = container["input"]
+                if not input_elem:
+                    st.error(f"Could not locate input element for question {idx+1}")
+                    print("Failed to find any input element for this question")
                 
                 if input_elem:
                     input_elem.clear()
@@ -391,6 +705,16 @@ def fill_form(driver, questions):
                 st.error(f"Error filling text question {idx+1}: {e}")
                 print(f"Exception: {str(e)}")
     
+    if to_click:
+        try:
+            failed = driver.execute_script(_CLICK_ALL_JS, to_click) or []
+            for i in failed:
+                st.error(f"Error selecting an option for question {click_questions[i]+1}")
+            print(f"Clicked {len(to_click) - len(failed)} of {len(to_click)} options")
+        except Exception as e:
+            st.error(f"Error selecting multiple-choice options: {e}")
+            print(f"Exception: {str(e)}")
+    
     print("\n---------- Form filling completed ----------")
     return True
 
@@ -401,62 +725,88 @@ def login_to_google(driver, email, password):
     try:
         # Navigate to Google login page
         driver.get("https://accounts.google.com/signin")
-        time.sleep(2)
+        email_input = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
+        )
         
         # Take screenshot to show the login page
-        screenshot = take_screenshot(driver)
-        st.image(screenshot, caption="Login Page", use_column_width=True)
+        show_screenshot(driver, "Login Page", debug=True)
         
         # Enter email
-        email_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email']"))
-        )
         email_input.clear()
         email_input.send_keys(email)
         email_input.send_keys(Keys.RETURN)
-        time.sleep(2)
+        # The email step already has a hidden password input, so wait for the
+        # real field to become usable rather than merely present
+        password_input = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "input[name='Passwd']"))
+        )
         
         # Take screenshot after email entry
-        screenshot = take_screenshot(driver)
-        st.image(screenshot, caption="Email Entered", use_column_width=True)
+        show_screenshot(driver, "Email Entered", debug=True)
         
         # Enter password
-        password_input = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='password']"))
-        )
         password_input.clear()
         password_input.send_keys(password)
         password_input.send_keys(Keys.RETURN)
-        time.sleep(5)  # Wait for login to complete
+        
+        # Wait once for login to settle: we leave the sign-in page, the account
+        # element appears, or a phone verification prompt shows up
+        try:
+            WebDriverWait(driver, 15).until(
+                lambda d: "signin" not in d.current_url
+                or d.find_elements(By.CSS_SELECTOR, "div[data-email]")
+                or d.find_elements(By.CSS_SELECTOR, "input[type='tel']")
+            )
+        except TimeoutException:
+            pass
         
         # Take screenshot after login attempt
-        screenshot = take_screenshot(driver)
-        st.image(screenshot, caption="Login Attempt Result", use_column_width=True)
+        show_screenshot(driver, "Login Attempt Result")
         
         # Check if login was successful by looking for a common element on the Google account page
-        try:
-            WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-email]"))
-            )
+        if driver.find_elements(By.CSS_SELECTOR, "div[data-email]"):
             return True
-        except:
-            # Check if we're no longer on the accounts.google.com/signin page
-            if "accounts.google.com/signin" not in driver.current_url:
-                return True
-            # Check for possible 2FA prompt
-            if "2-Step Verification" in driver.page_source or "verification" in driver.page_source.lower():
-                st.warning("Two-factor authentication detected. Please complete it in the browser window.")
-                return "2FA"
-            return False
+        # Check if we're no longer on the accounts.google.com/signin page
+        if "accounts.google.com/signin" not in driver.current_url:
+            return True
+        # Check for possible 2FA prompt
+        if "2-Step Verification" in driver.page_source or "verification" in driver.page_source.lower():
+            st.warning("Two-factor authentication detected. Please complete it in the browser window.")
+            return "2FA"
+        return False
             
     except Exception as e:
         st.error(f"Error during login: {str(e)}")
         return False
-def initialize_browser():
+@st.cache_resource
+def get_driver_path():
     """
-    Initialize a Chrome browser with Docker-compatible settings
+    Installs (or finds) the matching ChromeDriver once per process and returns its path
     """
+    # The Docker image ships a ChromeDriver matched to its Chrome; use it and
+    # skip webdriver-manager's version probe entirely
+    path = shutil.which("chromedriver")
+    if path:
+        return path
     from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
+def block_unneeded_requests(driver):
+    """
+    Tells Chrome to drop requests for fonts, media and analytics scripts.
+    """
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": _BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        print(f"Could not block unneeded requests: {e}")
+
+def initialize_browser():
+    """
+    Initialize a Chrome browser with Docker-compatible settings. Each session
+    gets its own browser, kept in st.session_state.driver across reruns.
+    """
     from selenium.webdriver.chrome.service import Service
     
     chrome_options = Options()
@@ -466,12 +816,21 @@ def initialize_browser():
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36")
+    # Skip images and notifications; we only need the form's DOM and data
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2
+    })
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    # Return from driver.get at DOMContentLoaded; explicit waits cover the rest
+    chrome_options.page_load_strategy = "eager"
     
     try:
         # First attempt: Try using webdriver-manager
         try:
-            service = Service(ChromeDriverManager().install())
+            service = Service(get_driver_path())
             driver = webdriver.Chrome(service=service, options=chrome_options)
+            block_unneeded_requests(driver)
             return driver
         except Exception as e1:
             st.warning(f"First browser initialization attempt failed: {e1}")
@@ -479,6 +838,7 @@ def initialize_browser():
             # Second attempt: Try direct Chrome browser instance
             try:
                 driver = webdriver.Chrome(options=chrome_options)
+                block_unneeded_requests(driver)
                 return driver
             except Exception as e2:
                 st.error(f"Second browser initialization attempt failed: {e2}")
@@ -494,6 +854,19 @@ This app uses a headless browser to help you fill Google Forms automatically wit
 You'll be able to see screenshots of what's happening in the browser as it progresses.
 """)
 
+# Screenshots cost a capture and encode per step, so allow turning them off
+st.sidebar.checkbox("Show screenshots", True, key="show_screenshots")
+st.sidebar.checkbox("Show step-by-step login screenshots", False, key="debug_screenshots")
+# Batch Mode halves Gemini cost but jobs are queued, so it's opt-in
+st.sidebar.checkbox("Use Gemini Batch Mode (cheaper, can take minutes)", False, key="use_batch_mode")
+
+# Show how many Gemini calls the answer cache has saved
+llm_cache = get_llm_cache()
+st.sidebar.markdown("### Gemini Answer Cache")
+st.sidebar.write(f"Hits: {llm_cache.hits} | Misses: {llm_cache.misses}")
+semantic_cache = get_semantic_cache()
+st.sidebar.write(f"Similar-question hits: {semantic_cache.hits} | Misses: {semantic_cache.misses}")
+
 # Initialize session state variables
 if "driver" not in st.session_state:
     st.session_state.driver = None
@@ -514,16 +887,22 @@ with st.form("google_login"):
     submit_button = st.form_submit_button("Login to Google")
     
     if submit_button and email and password:
-    # Initialize browser using our Docker-compatible function
+            # Start from a fresh browser rather than one already signed in
+            if st.session_state.driver:
+                try:
+                    st.session_state.driver.quit()
+                except Exception as e:
+                    print(f"Error closing previous browser: {e}")
+                st.session_state.driver = None
+            
+            # Initialize browser using our Docker-compatible function
             driver = initialize_browser()
             
             if driver:
                 st.session_state.driver = driver
                 
                 # Show initial browser window
-                screenshot = take_screenshot(driver)
-                st.session_state.screenshot = screenshot
-                st.image(screenshot, caption="Browser Started", use_column_width=True)
+                st.session_state.screenshot = show_screenshot(driver, "Browser Started", debug=True)
                 
                 # Try to login
                 login_result = login_to_google(driver, email, password)
@@ -578,16 +957,20 @@ if st.session_state.driver and (st.session_state.login_status == True or st.sess
             # Only load the form if questions aren't already processed
             if "questions" not in st.session_state:
                 driver.get(form_url)
-                time.sleep(5)  # Allow the form to load completely
+                # Questions are read from FB_PUBLIC_LOAD_DATA_, so wait for that
+                # rather than for the whole page to render
+                try:
+                    WebDriverWait(driver, 15).until(
+                        lambda d: d.execute_script("return typeof FB_PUBLIC_LOAD_DATA_ !== 'undefined';")
+                    )
+                except TimeoutException:
+                    pass
                 
                 # Show the form
-                screenshot = take_screenshot(driver)
-                st.image(screenshot, caption="Google Form Loaded", use_column_width=True)
-                
-                html = driver.page_source
+                show_screenshot(driver, "Google Form Loaded")
                 
                 # Extract questions from the form
-                questions = extract_questions_from_fb_data(html)
+                questions = extract_questions(driver)
                 if not questions:
                     st.error("No questions extracted from the form.")
                 else:
@@ -604,15 +987,17 @@ if st.session_state.driver and (st.session_state.login_status == True or st.sess
                 questions = st.session_state.questions
             
             # Display the questions and answers
+            # Sent as a single table rather than several writes per question
             st.write("--- Generated Answers ---")
-            for idx, q in enumerate(questions, start=1):
-                st.write(f"**Question {idx}:** {q['question_text']}")
-                if q["options"]:
-                    st.write("Options:", ", ".join(q["options"]))
-                else:
-                    st.write("(No multiple-choice options)")
-                st.write("**Generated Answer:**", q["gemini_answer"])
-                st.write("---")
+            answers_df = pd.DataFrame(
+                [{
+                    "Question": q["question_text"],
+                    "Options": ", ".join(q["options"]) if q["options"] else "(No multiple-choice options)",
+                    "Generated Answer": q["gemini_answer"],
+                } for q in questions],
+                index=range(1, len(questions) + 1)
+            )
+            st.dataframe(answers_df, use_container_width=True)
             
             # Add a clear separation before form actions
             st.markdown("### Form Actions")
@@ -623,22 +1008,18 @@ if st.session_state.driver and (st.session_state.login_status == True or st.sess
                     with st.spinner("Filling form..."):
                         # Navigate to the form again to ensure clean state
                         driver.get(st.session_state.form_url)
-                        time.sleep(3)
                         
+                        # fill_form waits for the form to render before filling it
                         if fill_form(driver, questions):
-                            time.sleep(2)  # Give time for all fields to be properly filled
+                            st.success("Form successfully filled with generated answers!")
                             
                             # Take screenshot after filling
-                            filled_screenshot = take_screenshot(driver)
-                            st.session_state.filled_screenshot = filled_screenshot
+                            st.session_state.filled_screenshot = show_screenshot(driver, "Form Filled with Answers")
                             st.session_state.form_filled = True
-                            
-                            st.success("Form successfully filled with generated answers!")
-                            st.image(filled_screenshot, caption="Form Filled with Answers", use_column_width=True)
             
             # Show the filled form if it exists in session state
             if st.session_state.get("form_filled", False) and "filled_screenshot" in st.session_state:
-                if not st.session_state.get("showing_filled_form", False):
+                if st.session_state.filled_screenshot is not None and not st.session_state.get("showing_filled_form", False):
                     st.image(st.session_state.filled_screenshot, caption="Form Filled with Generated Answers", use_column_width=True)
                     st.session_state.showing_filled_form = True
                 
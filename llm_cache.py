@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+# Default location of the on-disk Gemini answer cache
+CACHE_PATH = "./.gemini_cache.sqlite3"
+# Default location of the embedding-based (semantic) answer cache
+SEMANTIC_CACHE_PATH = "./.gemini_semantic_cache.npz"
+# Seconds a cached answer stays valid, shared by both caches so one can't
+# serve an answer the other has expired
+CACHE_TTL = 3600
+
+class LLMCache:
+    """
+    Persistent cache of Gemini answers keyed by a SHA-256 hash of the model,
+    question text and option set. Backed by SQLite so answers survive
+    Streamlit restarts; entries older than `ttl` seconds count as misses and
+    are pruned on startup and whenever a new answer is stored.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Streamlit runs every session in its own thread, so share one
+        # connection and serialize access to it
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created_at INTEGER)"
+        )
+        self._prune()
+        self._db.commit()
+
+    def _prune(self):
+        """
+        Deletes expired rows. Callers hold the lock (or own the connection) and commit.
+        """
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created_at + ? <= ?", (self.ttl, time.time()))
+
+    @staticmethod
+    def make_key(model, question_text, options):
+        """
+        Builds a deterministic cache key for a question and its options.
+        """
+        payload = json.dumps({"model": model, "q": question_text, "opts": sorted(options)}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached answer for `key`, or None on a miss or if it expired.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and row[1] + self.ttl <= time.time()):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """
+        Stores an answer under `key`, replacing any older entry.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, value, int(time.time()))
+            )
+            self._prune()
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SemanticCache:
+    """
+    Answer cache for near-duplicate questions. Stores one normalized embedding
+    per answered question and reuses an answer when a new question's embedding
+    has cosine similarity above `threshold` and the option set is identical.
+    Entries older than `ttl` seconds are ignored and dropped on save, matching
+    LLMCache. Persisted as a NumPy .npz file.
+    """
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, threshold=0.92, ttl=CACHE_TTL):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Whether there are entries in memory that aren't on disk yet
+        self._dirty = False
+        self._clear()
+        if os.path.exists(path):
+            try:
+                self._load(path)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                # A truncated or incompatible file shouldn't break the app;
+                # start empty and overwrite it on the next save
+                print(f"Could not load semantic cache from {path}, starting empty: {e}")
+                self._clear()
+
+    def _clear(self):
+        self._vectors = None
+        self._options = np.array([], dtype=str)
+        self._answers = np.array([], dtype=str)
+        self._created_at = np.array([], dtype=np.float64)
+
+    def _load(self, path):
+        with np.load(path) as data:
+            vectors = data["vectors"].copy()
+            options = data["options"].copy()
+            answers = data["answers"].copy()
+            # Files written before entries were timestamped are treated as expired
+            if "created_at" in data:
+                created_at = data["created_at"].copy()
+            else:
+                created_at = np.zeros(len(answers))
+        if vectors.ndim != 2 or not len(vectors) == len(options) == len(answers) == len(created_at):
+            raise ValueError("arrays have inconsistent shapes")
+        self._vectors = vectors
+        self._options = options
+        self._answers = answers
+        self._created_at = created_at
+
+    def __len__(self):
+        return 0 if self._vectors is None else len(self._vectors)
+
+    @staticmethod
+    def options_hash(options):
+        return hashlib.sha256(json.dumps(sorted(options)).encode()).hexdigest()
+
+    def _fresh(self):
+        """
+        Returns a boolean mask of the entries that haven't expired.
+        """
+        if self.ttl is None:
+            return np.ones(len(self._created_at), dtype=bool)
+        return self._created_at + self.ttl > time.time()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector, options):
+        """
+        Returns the answer of the most similar stored question with the same
+        options, or None if nothing clears the similarity threshold.
+        """
+        with self._lock:
+            if self._vectors is not None:
+                candidates = np.flatnonzero((self._options == self.options_hash(options)) & self._fresh())
+                if candidates.size:
+                    # Stored vectors are unit length, so this is cosine similarity
+                    scores = self._vectors[candidates] @ self._normalize(vector)
+                    best = int(np.argmax(scores))
+                    if scores[best] > self.threshold:
+                        self.hits += 1
+                        return str(self._answers[candidates[best]])
+            self.misses += 1
+            return None
+
+    def add(self, vector, options, answer):
+        """
+        Stores an answer in memory; call save() to persist it.
+        """
+        with self._lock:
+            row = self._normalize(vector)[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._options = np.append(self._options, self.options_hash(options))
+            self._answers = np.append(self._answers, answer)
+            self._created_at = np.append(self._created_at, time.time())
+            self._dirty = True
+
+    def save(self):
+        """
+        Drops expired entries and writes the cache to disk if anything changed.
+        The file is written to a temporary path and swapped in, so a crash
+        mid-write leaves the previous file intact.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return
+            fresh = self._fresh()
+            if not self._dirty and fresh.all():
+                return
+            self._vectors = self._vectors[fresh]
+            self._options = self._options[fresh]
+            self._answers = self._answers[fresh]
+            self._created_at = self._created_at[fresh]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f, vectors=self._vectors, options=self._options,
+                    answers=self._answers, created_at=self._created_at
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False